@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import asyncio
+import contextlib
 import json
 import yaml
 import os
@@ -10,50 +11,121 @@ from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 from crawl4ai.extraction_strategy import JsonCssExtractionStrategy
 from crawl4ai.deep_crawling import DFSDeepCrawlStrategy
 
+# Set UTF-8 encoding once, only on streams that need it
+for _stream in (sys.stdout, sys.stderr):
+    if (getattr(_stream, 'encoding', None) or '').lower() not in ('utf-8', 'utf8'):
+        try:
+            _stream.reconfigure(encoding='utf-8', errors='replace')
+        except AttributeError:
+            pass
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Fast JSON parse/serialize via orjson, then ujson, falling back to stdlib json
+if orjson:
+    _loads = orjson.loads
+    _JSONDecodeError = orjson.JSONDecodeError
+elif ujson:
+    _loads = ujson.loads
+    # ujson.JSONDecodeError only exists from ujson 5.0; all versions raise ValueError
+    _JSONDecodeError = ValueError
+else:
+    _loads = json.loads
+    _JSONDecodeError = json.JSONDecodeError
+
+def _dump_line(data):
+    """Serialize data to one compact line of UTF-8 JSON bytes."""
+    if orjson:
+        # Newline is appended inside the serializer, avoiding a bytes copy
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    if ujson:
+        return (ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False) + '\n').encode('utf-8')
+    return (json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+def _jsonl_to_json_array(jsonl_path, json_path):
+    """Stream a JSON Lines file into a JSON array file, one record at a time."""
+    with open(jsonl_path, 'rb') as src, open(json_path, 'wb') as dst:
+        dst.write(b'[')
+        separator = b'\n'
+        for line in src:
+            line = line.rstrip(b'\n')
+            if line:
+                dst.write(separator + line)
+                separator = b',\n'
+        dst.write(b'\n]\n')
+
 url_config = "https://process.gprocurement.go.th/egp2procmainWeb/jsp/procsearch.sch"
 
-async def main():
-    # Set UTF-8 encoding
-    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
-    sys.stderr.reconfigure(encoding='utf-8', errors='replace')
-    
-    # Load schema
-    with open('config/css_schema.json', 'r', encoding='utf-8') as f:
-        schema = json.load(f)
-    
-    # Create extraction strategy
-    extraction_strategy = JsonCssExtractionStrategy(schema, verbose=True)
-    
-    # Create deep crawl strategy - removed verbose parameter
-    deep_crawl_strategy = DFSDeepCrawlStrategy(
-        max_depth=2,  # Reduced depth for testing
-        include_external=False,  # Limit to internal links only
-        max_pages=10  # Reduced for testing
+# Ensure output directory exists and resolve output paths once
+_OUTPUT_DIR = Path('output')
+_OUTPUT_DIR.mkdir(exist_ok=True)
+_OUTPUT_PATH = _OUTPUT_DIR / 'deep_crawl_output.json'
+_DETAILED_OUTPUT_PATH = _OUTPUT_DIR / 'deep_crawl_detailed.json'
+_OUTPUT_JSONL_PATH = _OUTPUT_DIR / 'deep_crawl_output.jsonl'
+_DETAILED_JSONL_PATH = _OUTPUT_DIR / 'deep_crawl_detailed.jsonl'
+
+# Per-page detailed output is opt-in: set CRAWL_DETAILED=1 to write it
+_WRITE_DETAILED = os.environ.get('CRAWL_DETAILED', '').lower() in ('1', 'true', 'yes')
+
+# Load schema and build the extraction strategy once, at import time
+_SCHEMA = _loads(Path('config/css_schema.json').read_bytes())
+_EXTRACTION_STRATEGY = JsonCssExtractionStrategy(_SCHEMA, verbose=True)
+
+# Schema root is <body>, so wait until any field it extracts has rendered:
+# a text field with non-empty text, or an attribute field with that attribute
+_TEXT_SELECTORS = ', '.join(
+    f['selector'] for f in _SCHEMA['fields'] if f.get('type') == 'text'
+)
+_ATTRIBUTE_SELECTORS = ', '.join(
+    f['selector'] if f"[{f['attribute']}]" in f['selector'] else f"{f['selector']}[{f['attribute']}]"
+    for f in _SCHEMA['fields'] if f.get('type') == 'attribute'
+)
+_READY_CONDITIONS = []
+if _TEXT_SELECTORS:
+    _READY_CONDITIONS.append(
+        f"Array.from(document.querySelectorAll({json.dumps(_TEXT_SELECTORS)}))"
+        ".some(el => el.textContent.trim().length > 0)"
     )
-    
+if _ATTRIBUTE_SELECTORS:
+    _READY_CONDITIONS.append(f"document.querySelector({json.dumps(_ATTRIBUTE_SELECTORS)}) !== null")
+# No extractable fields means nothing to wait for
+_CONTENT_READY = f"js:() => {' || '.join(_READY_CONDITIONS)}" if _READY_CONDITIONS else None
+
+# Run config settings shared by the deep crawl and manual crawl configs
+_BASE_RUN_CONFIG = dict(
+    extraction_strategy=_EXTRACTION_STRATEGY,
+    remove_overlay_elements=True,
+    cache_mode=CacheMode.BYPASS,
+    verbose=True,
+    # Add these to help with SPA crawling
+    wait_for_images=True,
+    page_timeout=60000,
+    wait_for=_CONTENT_READY,  # Return as soon as the SPA has rendered content
+    css_selector="body"  # Wait for body to be available
+)
+
+# Deep crawl the site before falling back to the known URL list below. When
+# False, the known URLs are crawled directly and no deep crawl is issued.
+USE_DEEP_CRAWL = False
+
+# Max pages rendered at once during manual URL crawling
+MAX_CONCURRENT_PAGES = 4
+
+async def main():
     # Configure browser
     browser_config = BrowserConfig(
         headless=True,
         verbose=True
     )
     
-    # Configure crawler - ENABLE extraction strategy
-    run_config = CrawlerRunConfig(
-        extraction_strategy=extraction_strategy,
-        deep_crawl_strategy=deep_crawl_strategy,
-        remove_overlay_elements=True,
-        cache_mode=CacheMode.BYPASS,
-        verbose=True,
-        # Add these to help with SPA crawling
-        wait_for_images=True,
-        page_timeout=60000,
-        js_only=True,  # This helps with React/SPA sites
-        delay_before_return_html=5.0,  # Wait 5 seconds for JS to render
-        css_selector="body"  # Wait for body to be available
-    )
-    
-    print("Starting deep crawl of TradeSquare website...")
-    
     # Try crawling specific URLs manually if deep crawl doesn't find them
     urls_to_crawl = [
         "https://tradesquareltd.com/",
@@ -68,139 +140,180 @@ async def main():
     print("Starting crawl of TradeSquare website...")
     
     async with AsyncWebCrawler(config=browser_config) as crawler:
-        # Try deep crawl first
-        result = await crawler.arun(
-            url="https://tradesquareltd.com/",
-            config=run_config
-        )
+        if USE_DEEP_CRAWL:
+            # Create deep crawl strategy - removed verbose parameter
+            deep_crawl_strategy = DFSDeepCrawlStrategy(
+                max_depth=2,  # Reduced depth for testing
+                include_external=False,  # Limit to internal links only
+                max_pages=10  # Reduced for testing
+            )
+            
+            # Configure crawler - ENABLE extraction strategy
+            run_config = CrawlerRunConfig(
+                deep_crawl_strategy=deep_crawl_strategy,
+                **_BASE_RUN_CONFIG
+            )
+            
+            # Try deep crawl first
+            print("Starting deep crawl of TradeSquare website...")
+            result = await crawler.arun(
+                url="https://tradesquareltd.com/",
+                config=run_config
+            )
+        else:
+            # Known URL list already covers the site, skip straight to it
+            result = []
         
         # If deep crawl doesn't find many pages, try manual approach
         if isinstance(result, list) and len(result) < 3:
-            print("🔄 Deep crawl found limited pages, trying manual URL crawling...")
+            if USE_DEEP_CRAWL:
+                print("🔄 Deep crawl found limited pages, trying manual URL crawling...")
             
             # Create config without deep crawl strategy for manual crawling
-            manual_config = CrawlerRunConfig(
-                extraction_strategy=extraction_strategy,
-                remove_overlay_elements=True,
-                cache_mode=CacheMode.BYPASS,
-                verbose=True,
-                wait_for_images=True,
-                page_timeout=60000,
-                js_only=True,
-                delay_before_return_html=5.0,  # Wait 5 seconds for JS to render
-                css_selector="body"  # Wait for body to be available
+            manual_config = CrawlerRunConfig(**_BASE_RUN_CONFIG)
+            
+            # Skip URLs the deep crawl already fetched successfully
+            seen = {r.url.rstrip('/') for r in result if r.success}
+            todo = [u for u in urls_to_crawl if u.rstrip('/') not in seen]
+            
+            # Crawl URLs concurrently, bounded so we don't overload the host
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+            
+            async def crawl_url(url):
+                async with semaphore:
+                    print(f"🌐 Manually crawling: {url}")
+                    return await crawler.arun(url=url, config=manual_config)
+            
+            page_results = await asyncio.gather(
+                *(crawl_url(url) for url in todo),
+                return_exceptions=True
             )
             
-            # Crawl each URL manually
             manual_results = []
-            for url in urls_to_crawl:
-                print(f"🌐 Manually crawling: {url}")
-                try:
-                    page_result = await crawler.arun(url=url, config=manual_config)
-                    if page_result.success:
-                        manual_results.append(page_result)
-                        print(f"  ✅ Success: {url}")
-                    else:
-                        print(f"  ❌ Failed: {url} - {page_result.error_message}")
-                except Exception as e:
-                    print(f"  ❌ Error crawling {url}: {str(e)}")
-            
-            # Use manual results if we got more pages
-            if len(manual_results) > len(result) if isinstance(result, list) else 1:
-                result = manual_results
-                print(f"🔄 Using manual crawl results ({len(manual_results)} pages)")
+            for url, page_result in zip(todo, page_results):
+                if isinstance(page_result, BaseException):
+                    print(f"  ❌ Error crawling {url}: {str(page_result)}")
+                elif page_result.success:
+                    manual_results.append(page_result)
+                    print(f"  ✅ Success: {url}")
+                else:
+                    print(f"  ❌ Failed: {url} - {page_result.error_message}")
+            
+            # Merge manual results with the pages the deep crawl already found
+            if manual_results:
+                # Drop deep crawl failures that the manual pass recovered
+                recovered = {r.url.rstrip('/') for r in manual_results}
+                result = [
+                    r for r in result
+                    if r.success or r.url.rstrip('/') not in recovered
+                ] + manual_results
+                print(f"🔄 Merged {len(manual_results)} manually crawled pages ({len(result)} total)")
         
         # Handle results (list of results)
         if isinstance(result, list):
-            print(f"✅ Crawl completed!")
-            print(f"🌐 Crawled {len(result)} pages")
+            # Collect report lines and write them to stdout in one call
+            out = []
+            out.append(f"✅ Crawl completed!")
+            out.append(f"🌐 Crawled {len(result)} pages")
             
-            successful_results = [r for r in result if r.success]
-            failed_results = [r for r in result if not r.success]
+            # Partition results in a single pass
+            successful_results, failed_results = [], []
+            for r in result:
+                (successful_results if r.success else failed_results).append(r)
             
-            print(f"✅ Successful: {len(successful_results)}")
+            out.append(f"✅ Successful: {len(successful_results)}")
             if failed_results:
-                print(f"❌ Failed: {len(failed_results)}")
+                out.append(f"❌ Failed: {len(failed_results)}")
             
-            # Process each successful result
-            all_extracted_content = []
-            crawled_urls = []
+            # Process each successful result, streaming records to disk as we go
+            item_count = 0
+            preview_items = []
             
-            for i, page_result in enumerate(successful_results):
-                crawled_urls.append(page_result.url)
-                print(f"  {i+1}. {page_result.url}")
+            with contextlib.ExitStack() as stack:
+                # Bind hot-loop methods to locals once
+                write_out = stack.enter_context(open(_OUTPUT_JSONL_PATH, 'wb')).write
+                write_detailed = None
+                if _WRITE_DETAILED:
+                    write_detailed = stack.enter_context(open(_DETAILED_JSONL_PATH, 'wb')).write
                 
-                # Debug: Check what content we have
-                print(f"    - Has extracted_content: {page_result.extracted_content is not None}")
-                if page_result.extracted_content:
-                    print(f"    - Content length: {len(page_result.extracted_content)}")
-                
-                if page_result.extracted_content:
-                    try:
-                        content = json.loads(page_result.extracted_content)
-                        if isinstance(content, list):
-                            all_extracted_content.extend(content)
-                        else:
-                            all_extracted_content.append(content)
-                    except json.JSONDecodeError:
-                        # Handle non-JSON content
-                        all_extracted_content.append({
-                            "url": page_result.url,
-                            "content": page_result.extracted_content
-                        })
-                else:
-                    # If no extracted content, add a fallback entry
-                    all_extracted_content.append({
-                        "url": page_result.url,
-                        "status": "no_extraction",
-                        "markdown_preview": page_result.markdown[:200] + "..." if page_result.markdown else "No content"
-                    })
-            
-            # Ensure output directory exists
-            os.makedirs('output', exist_ok=True)
-            
-            # Save combined results
-            output_path = 'output/deep_crawl_output.json'
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(all_extracted_content, f, ensure_ascii=False, indent=2)
-            
-            print(f"💾 Results saved to: {output_path}")
-            
-            # Save individual page results
-            detailed_output_path = 'output/deep_crawl_detailed.json'
-            detailed_data = []
-            for page_result in successful_results:
-                page_data = {
-                    "url": page_result.url,
-                    "success": page_result.success,
-                    "extracted_content": page_result.extracted_content,
-                    "markdown": page_result.markdown[:500] + "..." if page_result.markdown and len(page_result.markdown) > 500 else page_result.markdown
-                }
-                detailed_data.append(page_data)
-            
-            with open(detailed_output_path, 'w', encoding='utf-8') as f:
-                json.dump(detailed_data, f, ensure_ascii=False, indent=2)
-            print(f"📊 Detailed crawl data saved to: {detailed_output_path}")
+                for i, page_result in enumerate(successful_results):
+                    url = page_result.url
+                    extracted_content = page_result.extracted_content
+                    markdown = page_result.markdown
+                    md = markdown or ''
+                    
+                    out.append(f"  {i+1}. {url}")
+                    
+                    # Debug: Check what content we have
+                    out.append(f"    - Has extracted_content: {extracted_content is not None}")
+                    if extracted_content:
+                        out.append(f"    - Content length: {len(extracted_content)}")
+                    
+                    content = extracted_content
+                    if extracted_content:
+                        try:
+                            content = _loads(extracted_content)
+                            items = content if isinstance(content, list) else [content]
+                        except _JSONDecodeError:
+                            # Handle non-JSON content
+                            items = [{
+                                "url": url,
+                                "content": extracted_content
+                            }]
+                    else:
+                        # If no extracted content, add a fallback entry
+                        items = [{
+                            "url": url,
+                            "status": "no_extraction",
+                            "markdown_preview": f"{md[:200]}..." if md else "No content"
+                        }]
+                    
+                    for item in items:
+                        write_out(_dump_line(item))
+                        if len(preview_items) < 3:
+                            preview_items.append(item)
+                    item_count += len(items)
+                    
+                    # Save individual page result, reusing the parsed content
+                    if write_detailed:
+                        write_detailed(_dump_line({
+                            "url": url,
+                            "success": page_result.success,
+                            "extracted_content": content,
+                            "markdown": f"{md[:500]}..." if len(md) > 500 else markdown
+                        }))
+            
+            # Combine the JSON Lines output into JSON arrays for existing consumers
+            _jsonl_to_json_array(_OUTPUT_JSONL_PATH, _OUTPUT_PATH)
+            out.append(f"💾 Results saved to: {_OUTPUT_PATH}")
+            
+            if _WRITE_DETAILED:
+                _jsonl_to_json_array(_DETAILED_JSONL_PATH, _DETAILED_OUTPUT_PATH)
+                out.append(f"📊 Detailed crawl data saved to: {_DETAILED_OUTPUT_PATH}")
+            else:
+                out.append("📊 Detailed crawl data skipped (set CRAWL_DETAILED=1 to write it)")
             
             # Print summary
-            if all_extracted_content:
-                print(f"📄 Extracted {len(all_extracted_content)} items total")
-                if all_extracted_content:
-                    print("\n📋 Preview of extracted content:")
-                    for i, item in enumerate(all_extracted_content[:3]):
+            if item_count:
+                out.append(f"📄 Extracted {item_count} items total")
+                if preview_items:
+                    out.append("\n📋 Preview of extracted content:")
+                    for i, item in enumerate(preview_items):
                         if isinstance(item, dict):
-                            title = item.get('title', item.get('name', item.get('url', 'No title')))
-                            print(f"\n{i+1}. {title}")
+                            title = item.get('title') or item.get('name') or item.get('url') or 'No title'
+                            out.append(f"\n{i+1}. {title}")
                             if 'link' in item:
-                                print(f"   🔗 {item['link']}")
+                                out.append(f"   🔗 {item['link']}")
                             if 'details' in item:
-                                print(f"   📝 {str(item['details'])[:100]}...")
+                                out.append(f"   📝 {str(item['details'])[:100]}...")
             
             # Print failed results if any
             if failed_results:
-                print("\n❌ Failed URLs:")
+                out.append("\n❌ Failed URLs:")
                 for failed_result in failed_results:
-                    print(f"  - {failed_result.url}: {failed_result.error_message}")
+                    out.append(f"  - {failed_result.url}: {failed_result.error_message}")
+            
+            sys.stdout.write('\n'.join(out) + '\n')
             
         else:
             # Handle single result (fallback)